@@ -1,56 +1,94 @@
-import time
-import random
+import asyncio
 from pathlib import Path
 
+import httpx
 import pandas as pd
 from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+
+from browser_daemon import fetch_html_async as fetch_html_with_browser
+from rate_limit import RateLimiter
 
 BASE = "https://www.basketball-reference.com"
 INDEX_URL = f"{BASE}/players/"
-OUT_PATH = Path("data/raw/players_index.csv")
+OUT_PATH = Path("data/raw/players_index.parquet")
+CONCURRENCY = 6  # letter pages in flight
+
+UA = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+async def fetch_fast(client: httpx.AsyncClient, url: str, selector: str) -> BeautifulSoup | None:
+    """
+    Plain HTTP GET, parsed. None if blocked or the page has nothing matching
+    `selector` (needs the browser).
+    """
+    try:
+        r = await client.get(url)
+    except httpx.HTTPError:
+        return None
+    if r.status_code != 200:
+        return None
+    soup = BeautifulSoup(r.text, "lxml")
+    if soup.select_one(selector) is None:
+        return None
+    return soup
 
-def fetch_html_with_browser(url: str) -> str:
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)  # istersen False yapıp tarayıcıyı görürsün
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            locale="en-US",
-        )
-        page = context.new_page()
-        page.goto(url, wait_until="domcontentloaded", timeout=60000)
-        # biraz bekleyelim (bot gibi görünmemek için)
-        page.wait_for_timeout(1500 + int(random.random() * 1000))
-        html = page.content()
-        context.close()
-        browser.close()
-        return html
+async def fetch_all(urls: list[str], selector: str, limiter: RateLimiter) -> dict[str, BeautifulSoup | None]:
+    """
+    Fetch and parse all urls, paced by `limiter`: concurrently over HTTP, the
+    browser daemon only for pages where `selector` did not match.
+    Pages that could not be fetched either way are None.
+    """
+    sem = asyncio.Semaphore(CONCURRENCY)
+    async with httpx.AsyncClient(
+        http2=True,
+        headers={"User-Agent": UA},
+        limits=httpx.Limits(max_keepalive_connections=8),
+        timeout=30,
+        follow_redirects=True,
+    ) as client:
+        async def fetch_one(url: str):
+            async with sem:
+                await limiter.wait()
+                return url, await fetch_fast(client, url, selector)
 
-def main():
-    html = fetch_html_with_browser(INDEX_URL)
-    soup = BeautifulSoup(html, "html.parser")
+        pages = dict(await asyncio.gather(*(fetch_one(u) for u in urls)))
+
+    for url, soup in pages.items():
+        if soup is not None:
+            continue
+        print("  -> falling back to browser:", url)
+        await limiter.wait()
+        try:
+            pages[url] = BeautifulSoup(await fetch_html_with_browser(url), "lxml")
+        except Exception as e:
+            # blocked / daemon down: leave it None, the caller skips the page
+            print(f"  !! browser fetch failed: {url} ({e!r})")
+    return pages
 
-    # /players/a/ ... /players/z/
-    letter_links = []
-    for a in soup.select("a[href^='/players/']"):
-        href = a.get("href", "")
-        if href.startswith("/players/") and href.count("/") == 3 and href.endswith("/"):
-            if len(href) == len("/players/a/"):
-                letter_links.append(href)
+async def main():
+    limiter = RateLimiter()  # REQUESTS_PER_MINUTE, see rate_limit.py
+    soup = (await fetch_all([INDEX_URL], "a[href='/players/a/']", limiter))[INDEX_URL]
+    if soup is None:
+        raise RuntimeError(f"Could not fetch {INDEX_URL} (blocked, or browser daemon not running).")
 
-    letter_links = sorted(set(letter_links))
+    # /players/a/ ... /players/z/ (dedup keeping on-page order, which is already a-z)
+    letter_links = list(dict.fromkeys(
+        href
+        for a in soup.select("a[href^='/players/']")
+        for href in [a.get("href", "")]
+        if href.startswith("/players/") and href.count("/") == 3 and href.endswith("/")
+        and len(href) == len("/players/a/")
+    ))
     if not letter_links:
         raise RuntimeError("Letter links not found. Site layout may have changed or page did not load correctly.")
 
+    print(f"Fetching {len(letter_links)} letter pages")
+    pages = await fetch_all([BASE + href for href in letter_links], "table#players", limiter)
+
     records = []
     for href in letter_links:
         url = BASE + href
-        print("Fetching:", url)
-
-        page_html = fetch_html_with_browser(url)
-        s = BeautifulSoup(page_html, "html.parser")
-
-        table = s.select_one("table#players")
+        page = pages[url]
+        table = page.select_one("table#players") if page is not None else None
         if table is None:
             print("  ⚠️ players table not found, skipping:", url)
             continue
@@ -60,12 +98,10 @@ def main():
             player_href = a.get("href", "")
             records.append({"player_name": name, "player_url": BASE + player_href})
 
-        time.sleep(0.8 + random.random() * 0.6)  # nazik bekleme
-
     df = pd.DataFrame(records).drop_duplicates()
     OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(OUT_PATH, index=False)
+    df.to_parquet(OUT_PATH, engine="pyarrow", compression="zstd", index=False)
     print(f"\nSaved {len(df):,} players to {OUT_PATH}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
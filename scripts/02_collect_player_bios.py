@@ -1,26 +1,47 @@
+import os
 import re
 import time
-import random
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import httpx
 import pandas as pd
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import zstandard
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
+
+from browser_daemon import DaemonNotRunning, fetch_html_async
+from rate_limit import RateLimiter
 
 # -----------------------------
 # Paths
 # -----------------------------
-INDEX_CSV = Path("data/raw/players_index.csv")
-OUT_CSV = Path("data/raw/players_bios.csv")
+INDEX_PATH = Path("data/raw/players_index.parquet")
+LEGACY_INDEX_CSV = Path("data/raw/players_index.csv")
+OUT_DIR = Path("data/raw/players_bios")  # parquet dataset of part files
+LEGACY_OUT_CSV = Path("data/raw/players_bios.csv")
 CACHE_DIR = Path("data/raw/cache/player_pages")
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+OUT_SCHEMA = pa.schema([
+    ("player_name", pa.string()),
+    ("player_url", pa.string()),
+    ("born_line", pa.string()),
+    ("country", pa.string()),
+    ("debut_year", pa.int64()),
+    ("error", pa.string()),
+])
+BATCH_SIZE = 50
+PART_BATCHES = 10  # batches per part file, i.e. at most 500 rows lost on a hard kill
+
 # -----------------------------
 # Scrape settings
 # -----------------------------
-HEADLESS = True
-MIN_SLEEP = 0.8
-MAX_SLEEP = 1.6
+CONCURRENCY = 8  # pages in flight on the browser daemon
+HTTP_CONCURRENCY = 16  # plain HTTP fast path
 TIMEOUT_MS = 60_000
 
 UA = (
@@ -29,6 +50,17 @@ UA = (
     "Chrome/120.0.0.0 Safari/537.36"
 )
 
+_SLUG_RE = re.compile(r"/players/[a-z]/([a-z0-9]+)\.html$")
+_WS_RE = re.compile(r"\s+")
+_NON_WORD_RE = re.compile(r"\W+")
+_US_TRAIL_RE = re.compile(r"\bus\b$")
+_US_STATE_RE = re.compile(r"[A-Z]{2}")
+_ALPHA_RE = re.compile(r"[A-Za-z]")
+_DEBUT_RE = re.compile(rb"NBA Debut:\s*(?:<[^>]*>\s*)*[A-Za-z]+\s+\d{1,2},\s+(\d{4})")
+# rate limiting itself shows up as a non-200 status (429/403); these
+# markers catch the challenge pages that come back as 200
+_BLOCK_MARKERS = (b"<title>Just a moment...</title>",)
+
 # -----------------------------
 # Helpers
 # -----------------------------
@@ -36,14 +68,29 @@ def slug_from_player_url(url: str) -> str:
     """
     https://www.basketball-reference.com/players/j/jamesle01.html -> jamesle01
     """
-    m = re.search(r"/players/[a-z]/([a-z0-9]+)\.html$", url)
-    return m.group(1) if m else re.sub(r"\W+", "_", url)
+    m = _SLUG_RE.search(url)
+    return m.group(1) if m else _NON_WORD_RE.sub("_", url)
 
 def cache_path_for(url: str) -> Path:
+    return CACHE_DIR / f"{slug_from_player_url(url)}.html.zst"
+
+def legacy_cache_path_for(url: str) -> Path:
+    # uncompressed cache written by older runs
     return CACHE_DIR / f"{slug_from_player_url(url)}.html"
 
+def is_cached(url: str) -> bool:
+    return cache_path_for(url).exists() or legacy_cache_path_for(url).exists()
+
+def write_cache(url: str, html: bytes):
+    # write-then-rename: a kill mid-write must not leave a truncated entry
+    # that is_cached() would count as present
+    path = cache_path_for(url)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(zstandard.ZstdCompressor(level=3).compress(html))
+    os.replace(tmp, path)
+
 def clean_text(s: str) -> str:
-    return re.sub(r"\s+", " ", s).strip()
+    return _WS_RE.sub(" ", s).strip()
 
 def extract_country_from_born(born_text: str) -> str | None:
     """
@@ -61,7 +108,7 @@ def extract_country_from_born(born_text: str) -> str | None:
 
     # basketball-reference sometimes uses a small country code link; text may include "us"
     # We'll look for trailing "us" token.
-    if re.search(r"\bus\b$", t.lower()):
+    if _US_TRAIL_RE.search(t.lower()):
         return "United States"
 
     # Many pages: "... City, State" for US players; non-US: "... City, Country"
@@ -70,10 +117,10 @@ def extract_country_from_born(born_text: str) -> str | None:
     if len(parts) >= 2:
         last = parts[-1]
         # If last looks like a US state (2 uppercase letters), assume USA
-        if re.fullmatch(r"[A-Z]{2}", last):
+        if _US_STATE_RE.fullmatch(last):
             return "United States"
         # If last is alphabetic and not too short, treat as country/region
-        if re.search(r"[A-Za-z]", last) and len(last) >= 3:
+        if _ALPHA_RE.search(last) and len(last) >= 3:
             return last
 
     # fallback: sometimes last word is country
@@ -82,158 +129,325 @@ def extract_country_from_born(born_text: str) -> str | None:
         last = tokens[-1]
         if last.lower() == "us":
             return "United States"
-        if len(last) >= 3 and re.search(r"[A-Za-z]", last):
+        if len(last) >= 3 and _ALPHA_RE.search(last):
             return last
 
     return None
 
-def extract_nba_debut_year(soup: BeautifulSoup) -> int | None:
+def extract_nba_debut_year(html: bytes) -> int | None:
     """
     On player pages there's often a line like:
       'NBA Debut: October 29, 2003'
-    We'll parse the year.
+    The label is literal text in the HTML, so we regex the raw page
+    (skipping any tags between label and date) instead of parsing it.
     """
-    text = soup.get_text(" ", strip=True)
-    m = re.search(r"NBA Debut:\s*[A-Za-z]+\s+\d{1,2},\s+(\d{4})", text)
+    m = _DEBUT_RE.search(html)
     if m:
         return int(m.group(1))
     return None
 
-def extract_born_line_text(soup: BeautifulSoup) -> str | None:
+def extract_born_line_text(tree: HTMLParser) -> str | None:
     """
     Try to locate the 'Born:' label in the player page.
     """
-    # Common structure: <strong>Born:</strong> ... (with surrounding text)
-    born_strong = soup.find("strong", string=re.compile(r"^Born:$", re.I))
-    if born_strong and born_strong.parent:
-        # Parent is typically a <p> containing the full "Born: ..." line.
-        return clean_text(born_strong.parent.get_text(" ", strip=True))
+    # The bio lives in div#meta: <p><strong>Born:</strong> ...</p>
+    # (only a handful of <p> there, vs. every <strong> on the page)
+    meta = tree.css_first("div#meta")
+    if meta is None:
+        return None
 
-    # fallback: search any strong that contains 'Born'
-    for st in soup.find_all("strong"):
-        if st.get_text(strip=True).lower() == "born:" and st.parent:
-            return clean_text(st.parent.get_text(" ", strip=True))
+    for p in meta.css("p"):
+        st = p.css_first("strong")
+        if st is not None and st.text(strip=True).lower() == "born:":
+            return clean_text(p.text(separator=" ", strip=True))
 
     return None
 
-def fetch_html_playwright(url: str, headless: bool = True) -> str:
+def is_block_page(html: bytes) -> bool:
+    """
+    A bot-challenge page served with 200 instead of the player page.
+    Only known markers count: a real player page may have neither a Born:
+    line nor an NBA debut (e.g. Dick Lee, Howard Nathan).
+    """
+    return any(marker in html for marker in _BLOCK_MARKERS)
+
+async def fetch_fast(client: httpx.AsyncClient, url: str) -> bytes | None:
     """
-    Fetch page HTML via a real browser context.
+    Plain HTTP GET (no browser). Returns None if the request is blocked
+    (non-200 status or a challenge page), i.e. it needs a real browser.
     """
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless)
-        context = browser.new_context(user_agent=UA, locale="en-US")
-        page = context.new_page()
-        page.goto(url, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
-        page.wait_for_timeout(1200 + int(random.random() * 900))
-        html = page.content()
-        context.close()
-        browser.close()
-        return html
+    try:
+        r = await client.get(url)
+    except httpx.HTTPError:
+        return None
+    if r.status_code != 200 or is_block_page(r.content):
+        return None
+    return r.content
 
-def get_player_page_html(url: str) -> str:
+async def fetch_with_browser(urls: list[str], limiter: RateLimiter) -> dict[str, str]:
+    """
+    Fetch pages through the shared browser daemon (scripts/browser_daemon.py),
+    writing each page to the cache.
+    Returns {url: error} for pages that could not be fetched.
+    """
+    errors = {}
+    sem = asyncio.Semaphore(CONCURRENCY)
+    fetched = 0
+    daemon_down = None
+
+    async def fetch_and_cache(url: str):
+        nonlocal fetched, daemon_down
+        async with sem:
+            if daemon_down is not None:
+                errors[url] = daemon_down
+                return
+            await limiter.wait()
+            try:
+                html = (await fetch_html_async(url)).encode("utf-8")
+            except DaemonNotRunning as e:
+                # a setup problem: record it for this and every remaining page
+                # (retried next run) so the pages already fetched still get written
+                if daemon_down is None:
+                    print(f"  !! {e} Skipping the browser fallback for this run.")
+                daemon_down = errors[url] = repr(e)
+                return
+            except Exception as e:
+                errors[url] = repr(e)
+                print(f"  !! fetch failed: {url} ({e!r})")
+                return
+        if is_block_page(html):
+            errors[url] = "browser got a block / challenge page"
+            print(f"  !! block page, not cached: {url}")
+            return
+        write_cache(url, html)
+        fetched += 1
+        print(f"  browser [{fetched}/{len(urls)}] {url}")
+
+    await asyncio.gather(*(fetch_and_cache(u) for u in urls))
+    return errors
+
+async def fetch_to_cache(urls: list[str]) -> dict[str, str]:
+    """
+    Fetch player pages into the cache: plain HTTP first, browser only for
+    pages the fast path could not get.
+    Returns {url: error} for pages that could not be fetched.
+    """
+    if not urls:
+        return {}
+
+    slow = []
+    sem = asyncio.Semaphore(HTTP_CONCURRENCY)
+    limiter = RateLimiter()  # REQUESTS_PER_MINUTE, see rate_limit.py
+    fetched = 0
+
+    async with httpx.AsyncClient(
+        http2=True,
+        headers={"User-Agent": UA},
+        limits=httpx.Limits(max_connections=HTTP_CONCURRENCY),
+        timeout=TIMEOUT_MS / 1000,
+        follow_redirects=True,
+    ) as client:
+        async def fast_one(url: str):
+            nonlocal fetched
+            async with sem:
+                await limiter.wait()
+                html = await fetch_fast(client, url)
+            if html is None:
+                slow.append(url)
+                return
+            write_cache(url, html)
+            fetched += 1
+            print(f"  http [{fetched}/{len(urls)}] {url}")
+
+        await asyncio.gather(*(fast_one(u) for u in urls))
+
+    if not slow:
+        return {}
+    print(f"Falling back to browser for {len(slow):,} pages")
+    return await fetch_with_browser(slow, limiter)
+
+def get_player_page_html(url: str) -> bytes:
     """
-    Cache-first fetch.
+    Read a player page from the cache (filled by fetch_to_cache).
     """
+    # raw bytes: lexbor and the debut regex work on them directly, no Python decode pass
     cpath = cache_path_for(url)
     if cpath.exists():
-        return cpath.read_text(encoding="utf-8", errors="ignore")
-
-    html = fetch_html_playwright(url, headless=HEADLESS)
-    cpath.write_text(html, encoding="utf-8")
-    return html
+        try:
+            return zstandard.ZstdDecompressor().decompress(cpath.read_bytes())
+        except zstandard.ZstdError:
+            # truncated by an older, non-atomic write: drop it so the next run refetches
+            cpath.unlink(missing_ok=True)
+            raise RuntimeError("corrupt cache entry (removed from cache)") from None
+    return legacy_cache_path_for(url).read_bytes()
+
+class PartWriter:
+    """
+    Append record batches to OUT_DIR as Parquet part files, starting a new
+    part every PART_BATCHES batches.
+    A part is written under a dot-name (skipped by dataset readers) and only
+    renamed once its footer is written, so a hard kill loses at most the part
+    in progress; those players are not marked done and get re-parsed from the
+    cache on the next run.
+    """
+    def __init__(self, out_dir: Path):
+        self.out_dir = out_dir
+        self.stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.seq = 0
+        self.batches = 0
+        self._writer = None
+        self._tmp = None
+
+    def write(self, records: list[dict]):
+        if self._writer is None:
+            self.seq += 1
+            self._tmp = self.out_dir / f".part-{self.stamp}-{self.seq:04d}.parquet.tmp"
+            self._writer = pq.ParquetWriter(self._tmp, OUT_SCHEMA, compression="zstd")
+        self._writer.write_table(pa.Table.from_pylist(records, schema=OUT_SCHEMA))
+        self.batches += 1
+        if self.batches % PART_BATCHES == 0:
+            self.close()
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._tmp.rename(self._tmp.with_name(self._tmp.name[1:].removesuffix(".tmp")))
+        self._writer = None
+
+def parse_one(job: tuple[str, str, str | None]) -> dict:
+    """
+    Build the output record for one player from its cached page.
+    Runs in a worker process, so it reads the cache itself (no HTML pickled).
+    """
+    name, url, fetch_error = job
+    try:
+        if fetch_error:
+            raise RuntimeError(fetch_error)
+        html = get_player_page_html(url)
+        if is_block_page(html):
+            # a block page cached by an older run: drop it so the next run refetches
+            cache_path_for(url).unlink(missing_ok=True)
+            legacy_cache_path_for(url).unlink(missing_ok=True)
+            raise RuntimeError("cached page is a block page (removed from cache)")
+
+        tree = HTMLParser(html)
+
+        born_line = extract_born_line_text(tree)  # "Born: ..."
+        country = extract_country_from_born(born_line) if born_line else None
+        debut_year = extract_nba_debut_year(html)
+
+        return {
+            "player_name": name,
+            "player_url": url,
+            "born_line": born_line,
+            "country": country,
+            "debut_year": debut_year,
+        }
+
+    except Exception as e:
+        # store error but keep going
+        return {
+            "player_name": name,
+            "player_url": url,
+            "born_line": None,
+            "country": None,
+            "debut_year": None,
+            "error": repr(e),
+        }
 
 # -----------------------------
 # Main
 # -----------------------------
-def main():
-    if not INDEX_CSV.exists():
-        raise FileNotFoundError(f"Missing {INDEX_CSV}. Run 01_collect_player_index.py first.")
+async def main():
+    index_path = INDEX_PATH if INDEX_PATH.exists() else LEGACY_INDEX_CSV
+    if not index_path.exists():
+        raise FileNotFoundError(f"Missing {INDEX_PATH}. Run 01_collect_player_index.py first.")
 
-    players = pd.read_csv(INDEX_CSV)
+    players = pd.read_parquet(index_path) if index_path.suffix == ".parquet" else pd.read_csv(index_path)
     if "player_url" not in players.columns:
-        raise ValueError("players_index.csv must include 'player_url' column.")
+        raise ValueError(f"{index_path.name} must include 'player_url' column.")
 
-    # Resume support: if OUT_CSV exists, skip already processed player_url
+    # Resume support: skip player_urls already in OUT_DIR (or a legacy players_bios.csv);
+    # rows that ended in an error are retried
     done_urls = set()
-    if OUT_CSV.exists() and OUT_CSV.stat().st_size > 0:
+    if any(OUT_DIR.glob("*.parquet")):
+        done = pq.read_table(OUT_DIR, columns=["player_url", "error"])
+        done = done.filter(pc.is_null(done["error"]))
+        done_urls |= set(done.column("player_url").drop_null().to_pylist())
+    if LEGACY_OUT_CSV.exists() and LEGACY_OUT_CSV.stat().st_size > 0:
         try:
-            existing = pd.read_csv(OUT_CSV)
-            if "player_url" in existing.columns:
-                done_urls = set(existing["player_url"].dropna().unique().tolist())
-                print(f"Resume: {len(done_urls):,} players already in {OUT_CSV}")
+            header = list(pd.read_csv(LEGACY_OUT_CSV, nrows=0).columns)
+            # older runs appended error rows under a header without 'error':
+            # the error text sits in an unnamed extra field, so name it
+            names = header if "error" in header else [*header, "error"]
+            # only the key columns; the wide born_line/country/... columns are not needed
+            legacy = pd.read_csv(
+                LEGACY_OUT_CSV, header=0, names=names, usecols=["player_url", "error"], dtype=str
+            )
+            done_urls |= set(legacy.loc[legacy["error"].isna(), "player_url"].dropna())
         except Exception:
-            # If it fails to read, we won't resume (better to fix file)
-            print("Warning: Could not read existing players_bios.csv; resume disabled.")
+            # If it fails to read, we won't resume from it (better to fix file)
+            print(f"Warning: Could not read existing {LEGACY_OUT_CSV}; not resuming from it.")
+    if done_urls:
+        print(f"Resume: {len(done_urls):,} players already done")
 
-    records = []
-    total = len(players)
-    processed = 0
-    saved_rows = 0
+    # column-wise string cleanup instead of a Series per row via iterrows()
+    names = players.get("player_name", pd.Series("", index=players.index)).astype(str).str.strip().tolist()
+    urls = players["player_url"].astype(str).str.strip().tolist()
 
-    for i, row in players.iterrows():
-        name = str(row.get("player_name", "")).strip()
-        url = str(row.get("player_url", "")).strip()
+    todo = []
+    for i, (name, url) in enumerate(zip(names, urls)):
         if not url or url in done_urls:
             continue
+        todo.append((i, name, url))
 
-        processed += 1
-        print(f"[{i+1}/{total}] {name} -> {url}")
+    # Fetch everything that is not cached yet, concurrently. Cached pages
+    # never reach the network side, so a warm re-parse run does no waiting.
+    uncached = [url for _, _, url in todo if not is_cached(url)]
+    print(f"Fetching {len(uncached):,} uncached pages ({len(todo) - len(uncached):,} cached)")
+    fetch_errors = await fetch_to_cache(uncached)
 
-        try:
-            html = get_player_page_html(url)
-            soup = BeautifulSoup(html, "html.parser")
-
-            born_line = extract_born_line_text(soup)  # "Born: ..."
-            country = extract_country_from_born(born_line) if born_line else None
-            debut_year = extract_nba_debut_year(soup)
-
-            rec = {
-                "player_name": name,
-                "player_url": url,
-                "born_line": born_line,
-                "country": country,
-                "debut_year": debut_year,
-            }
-            records.append(rec)
-
-        except Exception as e:
-            # store error but keep going
-            records.append({
-                "player_name": name,
-                "player_url": url,
-                "born_line": None,
-                "country": None,
-                "debut_year": None,
-                "error": repr(e),
-            })
-
-        # Polite rate limit
-        time.sleep(MIN_SLEEP + random.random() * (MAX_SLEEP - MIN_SLEEP))
-
-        # Save in batches
-        if len(records) >= 50:
-            df_batch = pd.DataFrame(records)
-            OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-            # append mode
-            header = not OUT_CSV.exists() or OUT_CSV.stat().st_size == 0
-            df_batch.to_csv(OUT_CSV, mode="a", index=False, header=header)
-            saved_rows += len(df_batch)
-            print(f"  ✅ wrote batch ({len(df_batch)}) -> {OUT_CSV} (total written this run: {saved_rows})")
-            records = []
-
-    # flush remaining
-    if records:
-        df_batch = pd.DataFrame(records)
-        OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-        header = not OUT_CSV.exists() or OUT_CSV.stat().st_size == 0
-        df_batch.to_csv(OUT_CSV, mode="a", index=False, header=header)
-        saved_rows += len(df_batch)
-        print(f"  ✅ wrote final batch ({len(df_batch)}) -> {OUT_CSV} (total written this run: {saved_rows})")
-
-    print("\nDone.")
-    print(f"Output: {OUT_CSV}")
+    total = len(players)
+    saved_rows = 0
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    # parts left unfinished by a killed run have no footer and can't be read;
+    # their players were never marked done, so just drop the files
+    for orphan in OUT_DIR.glob(".part-*.tmp"):
+        print(f"Removing unfinished part from an interrupted run: {orphan.name}")
+        orphan.unlink()
+
+    writer = PartWriter(OUT_DIR)
+    records = []
+
+    def write_batch():
+        nonlocal saved_rows, records
+        writer.write(records)
+        saved_rows += len(records)
+        print(f"  ✅ wrote batch ({len(records)}) -> {OUT_DIR} (total written this run: {saved_rows})")
+        records = []
+
+    # parse is CPU-bound: fan it out over all cores (ex.map keeps input order)
+    jobs = [(name, url, fetch_errors.get(url)) for _, name, url in todo]
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            for (i, name, url), rec in zip(todo, ex.map(parse_one, jobs, chunksize=64)):
+                print(f"[{i+1}/{total}] {name} -> {url}")
+
+                records.append(rec)
+                if len(records) >= BATCH_SIZE:
+                    write_batch()
+
+        # flush remaining
+        if records:
+            write_batch()
+    finally:
+        writer.close()
+
+    print(f"\nDone. Wrote {saved_rows:,} rows this run.")
+    print(f"Output: {OUT_DIR}")
     print(f"Cache dir: {CACHE_DIR}")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,6 +1,7 @@
 import re
 import time
-import random
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from urllib.parse import urljoin
 
@@ -12,7 +13,10 @@ BASE = "https://en.wikipedia.org"
 # NBA All-Star Game pages list (yearly index)
 INDEX_URL = f"{BASE}/wiki/NBA_All-Star_Game"
 
-OUT_CSV = Path("data/raw/all_star_selections.csv")
+OUT_PATH = Path("data/raw/all_star_selections.parquet")
+CACHE_DIR = Path("data/raw/cache/wikipedia_allstar")
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_MAX_AGE = None  # seconds; None = cached pages never expire
 
 HEADERS = {
     "User-Agent": (
@@ -23,31 +27,54 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.9",
 }
 
-SLEEP_MIN = 0.3
-SLEEP_MAX = 0.8
+MAX_WORKERS = 8  # year pages fetched in parallel
+
+# one keep-alive connection pool for all en.wikipedia.org requests
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS))
 
 MIN_YEAR = 1990
 MAX_YEAR = 2024  # completed seasons only
 
+_YEAR_LINK_RE = re.compile(r"^/wiki/(\d{4})_NBA_All-Star_Game$")
+
 
 def fetch(url: str) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=30)
+    r = SESSION.get(url, timeout=30)
     r.raise_for_status()
     return r.text
 
 
+def cache_path_for(url: str) -> Path:
+    return CACHE_DIR / f"{hashlib.sha1(url.encode()).hexdigest()}.html"
+
+
+def get_cached(url: str) -> str:
+    """
+    Cache-first fetch (refetched once older than CACHE_MAX_AGE).
+    """
+    cpath = cache_path_for(url)
+    if cpath.exists() and (CACHE_MAX_AGE is None or time.time() - cpath.stat().st_mtime < CACHE_MAX_AGE):
+        return cpath.read_text(encoding="utf-8")
+
+    html = fetch(url)
+    cpath.write_text(html, encoding="utf-8")
+    return html
+
+
 def extract_year_links(index_html: str) -> list[tuple[int, str]]:
     """
     From the NBA All-Star Game Wikipedia page, extract yearly game links like:
     /wiki/2020_NBA_All-Star_Game
     """
-    soup = BeautifulSoup(index_html, "html.parser")
+    soup = BeautifulSoup(index_html, "lxml")
     year_links = {}
 
     for a in soup.select('a[href^="/wiki/"]'):
         href = a.get("href", "")
         # only actual year game pages
-        m = re.search(r"^/wiki/(\d{4})_NBA_All-Star_Game$", href)
+        m = _YEAR_LINK_RE.search(href)
         if not m:
             continue
         year = int(m.group(1))
@@ -59,12 +86,15 @@ def extract_year_links(index_html: str) -> list[tuple[int, str]]:
 
 
 def parse_rosters(year: int, year_html: str) -> list[dict]:
-    soup = BeautifulSoup(year_html, "html.parser")
+    soup = BeautifulSoup(year_html, "lxml")
 
     # Most pages have roster tables with these ids (or very similar):
     # - East roster / West roster
     # - Team LeBron / Team Giannis etc.
+    # One pass over the tables: strict roster matches, plus looser
+    # "roster-like" candidates kept aside for the fallback.
     roster_tables = []
+    candidates = []
 
     for t in soup.select("table.wikitable"):
         tid = (t.get("id") or "").lower()
@@ -88,18 +118,14 @@ def parse_rosters(year: int, year_html: str) -> list[dict]:
 
         if is_roster and has_player and has_team_or_pos:
             roster_tables.append(t)
+        elif not roster_tables and has_player and (("team" in header) or ("pos" in header)):
+            candidates.append(t)
 
-    # Fallback: if above didn't work, try to grab the two most "roster-like" tables
+    # Fallback: if above didn't work, grab the two most "roster-like" tables
+    # (scored by number of player links)
     if not roster_tables:
-        candidates = []
-        for t in soup.select("table.wikitable"):
-            header = " ".join(th.get_text(" ", strip=True) for th in t.select("tr th")).lower()
-            if "player" in header and (("team" in header) or ("pos" in header)):
-                # score by number of player links
-                score = len(t.select('td a[href^="/wiki/"]'))
-                candidates.append((score, t))
-        candidates.sort(key=lambda x: x[0], reverse=True)
-        roster_tables = [t for _, t in candidates[:2]]  # usually East+West
+        candidates.sort(key=lambda t: len(t.select('td a[href^="/wiki/"]')), reverse=True)
+        roster_tables = candidates[:2]  # usually East+West
 
     records = []
     for t in roster_tables:
@@ -138,28 +164,31 @@ def parse_rosters(year: int, year_html: str) -> list[dict]:
 
 def main():
     print(">>> Fetching index:", INDEX_URL)
-    index_html = fetch(INDEX_URL)
+    index_html = get_cached(INDEX_URL)
 
     year_links = extract_year_links(index_html)
     print(f">>> Found {len(year_links)} year pages ({MIN_YEAR}-{MAX_YEAR}).")
 
-    all_rows = []
-    for year, url in year_links:
-        print(f">>> [{year}] {url}")
-        try:
-            html = fetch(url)
-            rows = parse_rosters(year, html)
-            print(f"    -> rows: {len(rows)}")
-            all_rows.extend(rows)
-        except Exception as e:
-            print(f"    !! error: {e!r}")
-
-        time.sleep(SLEEP_MIN + random.random() * (SLEEP_MAX - SLEEP_MIN))
+    rows_by_year = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futs = {ex.submit(get_cached, url): (year, url) for year, url in year_links}
+        for fut in as_completed(futs):
+            year, url = futs[fut]
+            print(f">>> [{year}] {url}")
+            try:
+                rows = parse_rosters(year, fut.result())
+                print(f"    -> rows: {len(rows)}")
+                rows_by_year[year] = rows
+            except Exception as e:
+                print(f"    !! error: {e!r}")
+
+    # keep output in season order regardless of completion order
+    all_rows = [r for year in sorted(rows_by_year) for r in rows_by_year[year]]
 
     df = pd.DataFrame(all_rows).drop_duplicates()
-    OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(OUT_CSV, index=False)
-    print(f">>> Saved {len(df):,} rows -> {OUT_CSV}")
+    OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(OUT_PATH, engine="pyarrow", compression="zstd", index=False)
+    print(f">>> Saved {len(df):,} rows -> {OUT_PATH}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+"""
+Long-lived headless Chromium shared by the scrapers.
+
+    python scripts/browser_daemon.py   # leave it running in another terminal
+
+01 and 02 only need a real browser as a fallback (see docs/DEVLOG.md). Instead
+of each run paying Chromium's cold start, they send the URL over a Unix socket
+and this process returns the page HTML.
+
+Protocol: client sends "<url>\\n"; daemon answers a 5-byte header
+(status: 0 ok / 1 error, payload length) followed by the UTF-8 payload
+(page HTML, or the error message).
+"""
+import os
+import atexit
+import signal
+import socket
+import struct
+import asyncio
+
+SOCKET_PATH = "/tmp/nba-scraper.sock"
+
+HEADLESS = True
+CONCURRENCY = 8  # pages rendered at once
+TIMEOUT_MS = 60_000
+
+UA = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+
+_HEADER = struct.Struct(">BI")
+
+# -----------------------------
+# Client side (used by 01 / 02)
+# -----------------------------
+class DaemonNotRunning(RuntimeError):
+    """
+    Nothing is listening on SOCKET_PATH (a setup problem, not a per-page error).
+    """
+
+def _not_running() -> DaemonNotRunning:
+    return DaemonNotRunning(
+        f"Browser daemon is not running on {SOCKET_PATH}. "
+        "Start it with: python scripts/browser_daemon.py"
+    )
+
+def _decode(status: int, payload: bytes) -> str:
+    text = payload.decode("utf-8")
+    if status != 0:
+        raise RuntimeError(f"browser daemon: {text}")
+    return text
+
+def fetch_html(url: str) -> str:
+    """
+    Fetch page HTML through the daemon's browser (blocking).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(SOCKET_PATH)
+        except (FileNotFoundError, ConnectionRefusedError):
+            raise _not_running() from None
+        sock.sendall(url.encode("utf-8") + b"\n")
+
+        with sock.makefile("rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise ConnectionError("browser daemon closed the connection")
+            status, length = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                raise ConnectionError("browser daemon closed the connection")
+            return _decode(status, payload)
+
+async def fetch_html_async(url: str) -> str:
+    """
+    Fetch page HTML through the daemon's browser (asyncio).
+    """
+    try:
+        reader, writer = await asyncio.open_unix_connection(SOCKET_PATH)
+    except (FileNotFoundError, ConnectionRefusedError):
+        raise _not_running() from None
+    try:
+        writer.write(url.encode("utf-8") + b"\n")
+        await writer.drain()
+        status, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        return _decode(status, await reader.readexactly(length))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+# -----------------------------
+# Daemon
+# -----------------------------
+def _unlink_socket():
+    try:
+        os.unlink(SOCKET_PATH)
+    except FileNotFoundError:
+        pass
+
+async def serve():
+    from playwright.async_api import async_playwright
+
+    # a leftover socket file from a crashed daemon is fine to remove; a live one is not
+    if os.path.exists(SOCKET_PATH):
+        try:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            probe.connect(SOCKET_PATH)
+            probe.close()
+            raise SystemExit(f"Another browser daemon is already listening on {SOCKET_PATH}")
+        except ConnectionRefusedError:
+            _unlink_socket()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    atexit.register(_unlink_socket)
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=HEADLESS)
+        sem = asyncio.Semaphore(CONCURRENCY)
+
+        async def render(url: str) -> str:
+            ctx = await browser.new_context(user_agent=UA, locale="en-US")
+            try:
+                page = await ctx.new_page()
+                response = await page.goto(url, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
+                # 403/429/5xx pages must not reach the clients' caches as real pages
+                if response is None or not response.ok:
+                    status = response.status if response is not None else "no response"
+                    raise RuntimeError(f"HTTP {status} for {url}")
+                return await page.content()
+            finally:
+                await ctx.close()
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                url = (await reader.readline()).decode("utf-8").strip()
+                try:
+                    async with sem:
+                        status, payload = 0, await render(url)
+                    print(f"ok    {url}")
+                except Exception as e:
+                    status, payload = 1, repr(e)
+                    print(f"error {url} ({e!r})")
+                body = payload.encode("utf-8")
+                writer.write(_HEADER.pack(status, len(body)) + body)
+                await writer.drain()
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(handle, path=SOCKET_PATH)
+        print(f"Browser daemon listening on {SOCKET_PATH} (Ctrl+C to stop)")
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            await browser.close()
+            _unlink_socket()
+
+    print("Browser daemon stopped.")
+
+if __name__ == "__main__":
+    asyncio.run(serve())
@@ -0,0 +1,26 @@
+"""
+Request pacing shared by the basketball-reference scrapers (01 and 02).
+"""
+import time
+import asyncio
+
+# basketball-reference blocks clients going over ~20 requests/minute;
+# within a run this budget is shared by the HTTP and browser paths
+REQUESTS_PER_MINUTE = 20
+
+class RateLimiter:
+    """
+    Spaces request starts evenly (per_minute) across all concurrent tasks.
+    """
+    def __init__(self, per_minute: float = REQUESTS_PER_MINUTE):
+        self.interval = 60 / per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)